@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
 import sqlite3
+import threading
 from datetime import datetime, date
-import uuid
+import secrets
 
 # Page configuration
 st.set_page_config(
@@ -14,105 +15,252 @@ st.set_page_config(
 # Database setup
 DB_FILE = "legal_entities.db"
 
-def init_database():
-    """Initialize SQLite database with tables"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+# Per-connection tuning applied in get_conn(); journal_mode=WAL is persistent and set once in init_database()
+CONNECTION_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+]
+
+@st.cache_resource
+def get_conn():
+    """Shared SQLite connection, kept open across reruns so its page cache stays warm"""
+    # isolation_level=None: autocommit, transactions are opened explicitly where needed
+    # cached_statements keeps the prepared form-handler statements below alive on this connection
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None, cached_statements=256)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+@st.cache_resource
+def get_write_lock():
+    """Process-wide lock serializing writes on the shared connection across sessions"""
+    return threading.Lock()
+
+# Schema applied by init_database() as a single script
+SCHEMA_DDL = """
+    -- Legal Entities table
+    CREATE TABLE IF NOT EXISTS legal_entities (
+        abn TEXT PRIMARY KEY,
+        entity_name TEXT NOT NULL,
+        parent_abn TEXT,
+        entity_type TEXT,
+        status TEXT DEFAULT 'Active',
+        effective_date DATE NOT NULL,
+        end_date DATE,
+        created_by TEXT,
+        created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        modified_by TEXT,
+        modified_date TIMESTAMP
+    );
     
-    # Legal Entities table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS legal_entities (
-            abn TEXT PRIMARY KEY,
-            entity_name TEXT NOT NULL,
-            parent_abn TEXT,
-            entity_type TEXT,
-            status TEXT DEFAULT 'Active',
-            effective_date DATE NOT NULL,
-            end_date DATE,
-            created_by TEXT,
-            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            modified_by TEXT,
-            modified_date TIMESTAMP
-        )
-    """)
+    -- Reporting Groups table
+    CREATE TABLE IF NOT EXISTS reporting_groups (
+        reporting_group_code TEXT PRIMARY KEY,
+        reporting_group_name TEXT NOT NULL,
+        description TEXT,
+        is_active BOOLEAN DEFAULT 1,
+        created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
     
-    # Reporting Groups table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reporting_groups (
-            reporting_group_code TEXT PRIMARY KEY,
-            reporting_group_name TEXT NOT NULL,
-            description TEXT,
-            is_active BOOLEAN DEFAULT 1,
-            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+    -- Sector Codes table
+    CREATE TABLE IF NOT EXISTS sector_codes (
+        sector_code TEXT PRIMARY KEY,
+        sector_name TEXT NOT NULL,
+        sector_description TEXT,
+        is_active BOOLEAN DEFAULT 1,
+        created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
     
-    # Sector Codes table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sector_codes (
-            sector_code TEXT PRIMARY KEY,
-            sector_name TEXT NOT NULL,
-            sector_description TEXT,
-            is_active BOOLEAN DEFAULT 1,
-            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+    -- Sector ABN Mapping table with consolidation percentage
+    CREATE TABLE IF NOT EXISTS sector_abn_mapping (
+        mapping_id TEXT PRIMARY KEY,
+        reporting_group_code TEXT NOT NULL,
+        sector_code TEXT NOT NULL,
+        abn TEXT NOT NULL,
+        consolidation_percentage REAL DEFAULT 100.0,
+        effective_date DATE NOT NULL,
+        end_date DATE,
+        is_active BOOLEAN DEFAULT 1,
+        created_by TEXT,
+        created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        modified_by TEXT,
+        modified_date TIMESTAMP
+    );
     
-    # Sector ABN Mapping table with consolidation percentage
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sector_abn_mapping (
-            mapping_id TEXT PRIMARY KEY,
-            reporting_group_code TEXT NOT NULL,
-            sector_code TEXT NOT NULL,
-            abn TEXT NOT NULL,
-            consolidation_percentage REAL DEFAULT 100.0,
-            effective_date DATE NOT NULL,
-            end_date DATE,
-            is_active BOOLEAN DEFAULT 1,
-            created_by TEXT,
-            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            modified_by TEXT,
-            modified_date TIMESTAMP
-        )
-    """)
+    -- Indexes for the mapping JOINs and the parent/child lookups
+    CREATE INDEX IF NOT EXISTS idx_map_group ON sector_abn_mapping(reporting_group_code);
+    CREATE INDEX IF NOT EXISTS idx_map_sector ON sector_abn_mapping(sector_code);
+    -- (abn, is_active) also covers active-only lookups; it supersedes the earlier abn-only index
+    DROP INDEX IF EXISTS idx_map_abn;
+    CREATE INDEX IF NOT EXISTS idx_map_abn_active ON sector_abn_mapping(abn, is_active);
+    CREATE INDEX IF NOT EXISTS idx_entities_parent ON legal_entities(parent_abn);
+    
+    -- Mappings with their group, sector and entity names, read by load_mappings_joined().
+    -- Recreated on each bootstrap so the stored definition always matches this one
+    DROP VIEW IF EXISTS v_mappings_enriched;
+    CREATE VIEW v_mappings_enriched AS
+    SELECT 
+        m.mapping_id, m.reporting_group_code, g.reporting_group_name,
+        m.sector_code, s.sector_name, m.abn, e.entity_name,
+        m.consolidation_percentage, m.effective_date, m.end_date, m.is_active
+    FROM sector_abn_mapping m
+    LEFT JOIN reporting_groups g ON m.reporting_group_code = g.reporting_group_code
+    LEFT JOIN sector_codes s ON m.sector_code = s.sector_code
+    LEFT JOIN legal_entities e ON m.abn = e.abn;
+"""
+
+def init_database():
+    """Initialize SQLite database with tables"""
+    cursor = get_conn().cursor()
+    
+    # WAL mode is stored in the database file; in-memory databases don't support it.
+    # The PRAGMA returns a row, read it so the statement isn't left open for the script below
+    if DB_FILE != ":memory:":
+        cursor.execute("PRAGMA journal_mode=WAL").fetchone()
+    
+    # All tables and indexes in one script and one transaction, so a cold start commits once
+    cursor.executescript(f"BEGIN; {SCHEMA_DDL} COMMIT;")
     
     # Migration: Add consolidation_percentage column if it doesn't exist
-    try:
-        cursor.execute("SELECT consolidation_percentage FROM sector_abn_mapping LIMIT 1")
-    except sqlite3.OperationalError:
-        # Column doesn't exist, add it
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(sector_abn_mapping)")]
+    if "consolidation_percentage" not in columns:
         cursor.execute("""
             ALTER TABLE sector_abn_mapping 
             ADD COLUMN consolidation_percentage REAL DEFAULT 100.0
         """)
-        conn.commit()
     
-    conn.commit()
-    conn.close()
+    # Refresh planner statistics; only runs ANALYZE on tables that need it
+    cursor.execute("PRAGMA optimize")
 
 # Helper functions
-def load_data(table_name):
-    """Load data from SQLite table"""
+def query_df(query, params=()):
+    """Run a SELECT and build the DataFrame directly from the cursor rows"""
+    # Cheaper than pd.read_sql_query's generic type-inference path for these small tables
+    cursor = get_conn().execute(query, params)
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=[c[0] for c in cursor.description])
+
+# Low-cardinality columns stored as categoricals so filters compare int codes, not strings
+CATEGORY_COLUMNS = ["status", "entity_type", "is_active"]
+
+# Key columns stored as Arrow strings (pyarrow ships with Streamlit) instead of Python objects
+ARROW_STRING_COLUMNS = ["abn", "parent_abn"]
+
+# Columns the UI reads from each table, in display order, so the frames go to st.dataframe
+# as loaded; the audit columns are never displayed
+ENTITY_COLUMNS = ("abn", "entity_name", "parent_abn", "entity_type", "status", "effective_date")
+REPORTING_GROUP_COLUMNS = ("reporting_group_code", "reporting_group_name", "description", "is_active")
+SECTOR_CODE_COLUMNS = ("sector_code", "sector_name", "sector_description", "is_active")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_data(table_name, columns=None):
+    """Load data from SQLite table, optionally only the given columns (cached, cleared on every write)"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-        conn.close()
+        df = query_df(f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}")
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+        for col in ARROW_STRING_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype("string[pyarrow]")
         return df
     except Exception as e:
         st.error(f"Error loading {table_name}: {str(e)}")
         return pd.DataFrame()
 
-def execute_query(query, params=None):
-    """Execute SQL query"""
+@st.cache_data(ttl=60, show_spinner=False)
+def load_mappings_joined(group_names=None, sector_names=None, active_only=False):
+    """Load sector mappings joined with group, sector and entity names, optionally filtered"""
+    # Filters are applied in SQL so only the rows shown are materialized; None means no filter
+    conditions, params = [], []
+    if group_names is not None:
+        # An empty selection gives IN (), which SQLite accepts and matches nothing
+        conditions.append(f"reporting_group_name IN ({', '.join('?' * len(group_names))})")
+        params += group_names
+    if sector_names is not None:
+        conditions.append(f"sector_name IN ({', '.join('?' * len(sector_names))})")
+        params += sector_names
+    if active_only:
+        conditions.append("is_active = 1")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    # The JOIN lives in the v_mappings_enriched view (see SCHEMA_DDL); SQLite inlines it,
+    # so the WHERE above still reaches the underlying tables and their indexes
+    query = f"SELECT * FROM v_mappings_enriched {where} ORDER BY reporting_group_name, sector_name"
+    df = query_df(query, params)
+    # Parse end dates once per load (vectorized) rather than per render in the edit form
+    df['end_date'] = pd.to_datetime(df['end_date'], errors='coerce').dt.date
+    return df
+
+def exists(table_name, key_column=None, key_value=None):
+    """Check whether table has a row with key_column = key_value (or any row without a column)"""
+    # EXISTS stops at the first match, served by the primary key or an index where there is one
+    if key_column is None:
+        cursor = get_conn().execute(f"SELECT EXISTS(SELECT 1 FROM {table_name})")
+    else:
+        cursor = get_conn().execute(f"SELECT EXISTS(SELECT 1 FROM {table_name} WHERE {key_column} = ?)", (key_value,))
+    return bool(cursor.fetchone()[0])
+
+# Upper bound on the parent choices offered by the Add Entity form
+PARENT_SEARCH_LIMIT = 50
+
+@st.cache_data(ttl=30, show_spinner=False)
+def search_parent_entities(term):
+    """ABN -> name for up to PARENT_SEARCH_LIMIT entities whose ABN or name contains term"""
+    pattern = f"%{term}%"
+    cursor = get_conn().execute(
+        "SELECT abn, entity_name FROM legal_entities WHERE abn LIKE ? OR entity_name LIKE ? ORDER BY entity_name LIMIT ?",
+        (pattern, pattern, PARENT_SEARCH_LIMIT)
+    )
+    return dict(cursor.fetchall())
+
+@st.cache_resource
+def get_lookups():
+    """Code -> name dicts for groups, sectors and entities, shared by all sessions (read only)"""
+    conn = get_conn()
+    return {
+        "group_name": dict(conn.execute("SELECT reporting_group_code, reporting_group_name FROM reporting_groups").fetchall()),
+        "sector_name": dict(conn.execute("SELECT sector_code, sector_name FROM sector_codes").fetchall()),
+        "entity_name": dict(conn.execute("SELECT abn, entity_name FROM legal_entities").fetchall()),
+    }
+
+def clear_data_cache():
+    """Invalidate cached query results after the database changes"""
+    load_data.clear()
+    load_mappings_joined.clear()
+    search_parent_entities.clear()
+    get_lookups.clear()
+
+def execute_query(query, params=None, duplicate_message=None):
+    """Execute SQL query; duplicate_message replaces the generic error on a key conflict"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        conn.commit()
-        conn.close()
+        with get_write_lock():
+            cursor = get_conn().cursor()
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+        clear_data_cache()
+        return True
+    except sqlite3.IntegrityError as e:
+        st.error(duplicate_message or f"Database error: {str(e)}")
+        return False
+    except Exception as e:
+        st.error(f"Database error: {str(e)}")
+        return False
+
+def execute_many(query, seq_of_params):
+    """Execute SQL query once per parameter row in a single transaction (for bulk writes)"""
+    conn = get_conn()
+    try:
+        with get_write_lock():
+            # One explicit transaction so a bulk load commits once and rolls back as a whole
+            conn.execute("BEGIN")
+            with conn:
+                conn.executemany(query, seq_of_params)
+        clear_data_cache()
         return True
     except Exception as e:
         st.error(f"Database error: {str(e)}")
@@ -123,79 +271,164 @@ def delete_record(table_name, key_column, key_value):
     query = f"DELETE FROM {table_name} WHERE {key_column} = ?"
     return execute_query(query, (key_value,))
 
-# Initialize database
-init_database()
+def new_mapping_id():
+    """Generate a random mapping ID that isn't already taken"""
+    # 32 random bits can collide once the table grows, so draw again on a hit
+    while True:
+        mapping_id = "MAP" + secrets.token_hex(4).upper()
+        if not exists("sector_abn_mapping", "mapping_id", mapping_id):
+            return mapping_id
+
+def has_children(abn):
+    """Check whether any entity has abn as its parent"""
+    return exists("legal_entities", "parent_abn", abn)
+
+def delete_entity(abn):
+    """Delete a legal entity, refusing if it still has children"""
+    conn = get_conn()
+    try:
+        # BEGIN IMMEDIATE takes SQLite's write lock up front so no child can be added
+        # between the check and the delete
+        with get_write_lock():
+            conn.execute("BEGIN IMMEDIATE")
+            with conn:
+                if has_children(abn):
+                    st.error("❌ Cannot delete entity with children!")
+                    return False
+                conn.execute("DELETE FROM legal_entities WHERE abn = ?", (abn,))
+    except Exception as e:
+        st.error(f"Database error: {str(e)}")
+        return False
+    clear_data_cache()
+    return True
+
+# Write statements used by the form handlers; kept as constants so the connection's
+# statement cache reuses the prepared statement instead of re-parsing on every submit
+INSERT_ENTITY_SQL = """
+    INSERT INTO legal_entities 
+    (abn, entity_name, parent_abn, entity_type, status, effective_date, created_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPDATE_ENTITY_SQL = """
+    UPDATE legal_entities 
+    SET entity_name = ?, entity_type = ?, status = ?, modified_by = ?, modified_date = ?
+    WHERE abn = ?
+"""
+
+INSERT_MAPPING_SQL = """
+    INSERT INTO sector_abn_mapping 
+    (mapping_id, reporting_group_code, sector_code, abn, consolidation_percentage, effective_date, created_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPDATE_MAPPING_SQL = """
+    UPDATE sector_abn_mapping 
+    SET consolidation_percentage = ?, is_active = ?, end_date = ?, modified_by = ?, modified_date = ?
+    WHERE mapping_id = ?
+"""
+
+INSERT_REPORTING_GROUP_SQL = "INSERT INTO reporting_groups (reporting_group_code, reporting_group_name, description) VALUES (?, ?, ?)"
+
+INSERT_SECTOR_CODE_SQL = "INSERT INTO sector_codes (sector_code, sector_name, sector_description) VALUES (?, ?, ?)"
 
 # Insert sample data based on Alpha Holdings structure
 def insert_sample_data():
     """Insert sample data for demo purposes"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_conn()
     cursor = conn.cursor()
     
-    # Check if data exists
-    cursor.execute("SELECT COUNT(*) FROM legal_entities")
-    if cursor.fetchone()[0] == 0:
-        # Insert reporting groups
-        cursor.executemany("""
-            INSERT INTO reporting_groups (reporting_group_code, reporting_group_name, description)
-            VALUES (?, ?, ?)
-        """, [
-            ('FIN_INT', 'Financial Internal Reporting', 'Management and internal financial reporting'),
-            ('FIN_REG', 'Financial Regulatory Reporting', 'Statutory and regulator submissions'),
-            ('OPS_MIS', 'Operations MIS Reporting', 'Operational performance reporting')
-        ])
+    # Check if data exists; EXISTS stops at the first row instead of counting them all
+    if not exists("legal_entities"):
+        # Seed all four tables in one transaction (single commit, rolled back on failure)
+        cursor.execute("BEGIN")
+        with conn:
+            # Insert reporting groups
+            cursor.executemany("""
+                INSERT INTO reporting_groups (reporting_group_code, reporting_group_name, description)
+                VALUES (?, ?, ?)
+            """, [
+                ('FIN_INT', 'Financial Internal Reporting', 'Management and internal financial reporting'),
+                ('FIN_REG', 'Financial Regulatory Reporting', 'Statutory and regulator submissions'),
+                ('OPS_MIS', 'Operations MIS Reporting', 'Operational performance reporting')
+            ])
         
-        # Insert sector codes
-        cursor.executemany("""
-            INSERT INTO sector_codes (sector_code, sector_name, sector_description)
-            VALUES (?, ?, ?)
-        """, [
-            ('F1N01', 'Financial Services', 'Banking, lending, and financial operations'),
-            ('T3C02', 'Technology', 'Software, IT services, and infrastructure'),
-            ('O9P88', 'Operations', 'Logistics, supply chain, and operations'),
-            ('R7D55', 'Research & Dev', 'Innovation and product development')
-        ])
+            # Insert sector codes
+            cursor.executemany("""
+                INSERT INTO sector_codes (sector_code, sector_name, sector_description)
+                VALUES (?, ?, ?)
+            """, [
+                ('F1N01', 'Financial Services', 'Banking, lending, and financial operations'),
+                ('T3C02', 'Technology', 'Software, IT services, and infrastructure'),
+                ('O9P88', 'Operations', 'Logistics, supply chain, and operations'),
+                ('R7D55', 'Research & Dev', 'Innovation and product development')
+            ])
         
-        # Insert legal entities
-        cursor.executemany("""
-            INSERT INTO legal_entities (abn, entity_name, parent_abn, entity_type, status, effective_date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, [
-            ('91000000001', 'Alpha Holdings Pty Ltd', None, 'Parent', 'Active', '2010-01-01'),
-            ('91000000002', 'Alpha Finance Pty Ltd', '91000000001', 'Subsidiary', 'Active', '2012-03-15'),
-            ('91000000003', 'Alpha Operations JV', '91000000001', 'JV', 'Active', '2013-06-01'),
-            ('91000000004', 'Alpha Technology Pty Ltd', '91000000001', 'Subsidiary', 'Active', '2014-09-20'),
-            ('91000000005', 'Alpha Finance Services Pty Ltd', '91000000002', 'Subsidiary', 'Active', '2015-02-01'),
-            ('91000000006', 'Alpha Finance Consulting JV', '91000000002', 'JV', 'Active', '2016-05-10'),
-            ('91000000007', 'Alpha Ops Logistics Pty Ltd', '91000000003', 'Subsidiary', 'Active', '2016-08-01'),
-            ('91000000008', 'Alpha Ops Support JV', '91000000003', 'JV', 'Active', '2017-01-15'),
-            ('91000000009', 'Alpha Tech Software Pty Ltd', '91000000004', 'Subsidiary', 'Active', '2017-07-01'),
-            ('91000000010', 'Alpha Tech Infrastructure JV', '91000000004', 'JV', 'Active', '2018-03-12'),
-            ('91000000011', 'Alpha Tech R&D Pty Ltd', '91000000004', 'Subsidiary', 'Active', '2019-11-05')
-        ])
+            # Insert legal entities
+            cursor.executemany("""
+                INSERT INTO legal_entities (abn, entity_name, parent_abn, entity_type, status, effective_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                ('91000000001', 'Alpha Holdings Pty Ltd', None, 'Parent', 'Active', '2010-01-01'),
+                ('91000000002', 'Alpha Finance Pty Ltd', '91000000001', 'Subsidiary', 'Active', '2012-03-15'),
+                ('91000000003', 'Alpha Operations JV', '91000000001', 'JV', 'Active', '2013-06-01'),
+                ('91000000004', 'Alpha Technology Pty Ltd', '91000000001', 'Subsidiary', 'Active', '2014-09-20'),
+                ('91000000005', 'Alpha Finance Services Pty Ltd', '91000000002', 'Subsidiary', 'Active', '2015-02-01'),
+                ('91000000006', 'Alpha Finance Consulting JV', '91000000002', 'JV', 'Active', '2016-05-10'),
+                ('91000000007', 'Alpha Ops Logistics Pty Ltd', '91000000003', 'Subsidiary', 'Active', '2016-08-01'),
+                ('91000000008', 'Alpha Ops Support JV', '91000000003', 'JV', 'Active', '2017-01-15'),
+                ('91000000009', 'Alpha Tech Software Pty Ltd', '91000000004', 'Subsidiary', 'Active', '2017-07-01'),
+                ('91000000010', 'Alpha Tech Infrastructure JV', '91000000004', 'JV', 'Active', '2018-03-12'),
+                ('91000000011', 'Alpha Tech R&D Pty Ltd', '91000000004', 'Subsidiary', 'Active', '2019-11-05')
+            ])
         
-        # Insert sector mappings with random consolidation percentages
-        cursor.executemany("""
-            INSERT INTO sector_abn_mapping 
-            (mapping_id, reporting_group_code, sector_code, abn, consolidation_percentage, effective_date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, [
-            ('MAP001', 'FIN_INT', 'F1N01', '91000000002', 100.0, '2020-01-01'),
-            ('MAP002', 'FIN_REG', 'F1N01', '91000000005', 100.0, '2020-01-01'),
-            ('MAP003', 'FIN_INT', 'T3C02', '91000000004', 100.0, '2020-01-01'),
-            ('MAP004', 'FIN_REG', 'T3C02', '91000000009', 100.0, '2020-01-01'),
-            ('MAP005', 'OPS_MIS', 'O9P88', '91000000003', 50.0, '2020-01-01'),
-            ('MAP006', 'FIN_INT', 'O9P88', '91000000007', 75.0, '2020-01-01'),
-            ('MAP007', 'FIN_INT', 'R7D55', '91000000011', 100.0, '2021-01-01'),
-            ('MAP008', 'FIN_REG', 'R7D55', '91000000010', 50.0, '2021-01-01')
-        ])
+            # Insert sector mappings with random consolidation percentages
+            cursor.executemany("""
+                INSERT INTO sector_abn_mapping 
+                (mapping_id, reporting_group_code, sector_code, abn, consolidation_percentage, effective_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                ('MAP001', 'FIN_INT', 'F1N01', '91000000002', 100.0, '2020-01-01'),
+                ('MAP002', 'FIN_REG', 'F1N01', '91000000005', 100.0, '2020-01-01'),
+                ('MAP003', 'FIN_INT', 'T3C02', '91000000004', 100.0, '2020-01-01'),
+                ('MAP004', 'FIN_REG', 'T3C02', '91000000009', 100.0, '2020-01-01'),
+                ('MAP005', 'OPS_MIS', 'O9P88', '91000000003', 50.0, '2020-01-01'),
+                ('MAP006', 'FIN_INT', 'O9P88', '91000000007', 75.0, '2020-01-01'),
+                ('MAP007', 'FIN_INT', 'R7D55', '91000000011', 100.0, '2021-01-01'),
+                ('MAP008', 'FIN_REG', 'R7D55', '91000000010', 50.0, '2021-01-01')
+            ])
         
-        conn.commit()
-    
-    conn.close()
+        # Gather planner statistics now that the tables have representative data
+        cursor.execute("ANALYZE")
+
+@st.cache_resource
+def bootstrap_database():
+    """Create the schema and seed sample data once per process"""
+    init_database()
+    insert_sample_data()
+    return True
+
+# Initialize database and insert sample data; cached so reruns skip the schema and seed probes
+bootstrap_database()
 
-# Insert sample data
-insert_sample_data()
+# Tree display lookups; unknown types fall back to 📋 / other-node and non-active statuses to ⏸️
+TYPE_EMOJI = {"Parent": "🏛️", "Subsidiary": "🏢", "JV": "🤝"}
+NODE_CLASS = {"Parent": "parent-node", "Subsidiary": "subsidiary-node", "JV": "jv-node"}
+STATUS_EMOJI = {"Active": "✅"}
+
+# Rows sent to the browser per st.dataframe; longer tables get a page selector
+PAGE_SIZE = 100
+
+def paginate(df, key):
+    """Return the page of df picked in a page selector, shown only when df spans several pages"""
+    # The frames are already cached in memory; windowing them keeps the Arrow payload
+    # shipped to the browser constant instead of growing with the table
+    page_count = max(1, -(-len(df) // PAGE_SIZE))
+    if page_count == 1:
+        return df
+    page_num = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key=key)
+    st.caption(f"Page {page_num} of {page_count} ({len(df)} rows)")
+    return df.iloc[(page_num - 1) * PAGE_SIZE:page_num * PAGE_SIZE]
 
 # App UI
 st.title("🏢 Legal Entity & Sector Code Management")
@@ -213,8 +446,15 @@ page = st.sidebar.radio(
 st.sidebar.markdown("---")
 if st.sidebar.button("🔄 Reset to Sample Data"):
     import os
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
+    # Release the shared connection before removing the file it points at
+    get_conn().close()
+    get_conn.clear()
+    bootstrap_database.clear()
+    clear_data_cache()
+    # Remove the WAL sidecar files too so a stale log isn't replayed into the new database
+    for path in (DB_FILE, f"{DB_FILE}-wal", f"{DB_FILE}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
     st.sidebar.success("Database reset! Refreshing...")
     st.rerun()
 
@@ -224,26 +464,31 @@ if st.sidebar.button("🔄 Reset to Sample Data"):
 if page == "Legal Entity Hierarchy":
     st.header("Legal Entity Hierarchy Management")
     
+    # Loaded once for the page and shared by the view and edit tabs
+    entities_df = load_data("legal_entities", ENTITY_COLUMNS)
+    
     tab1, tab2, tab3 = st.tabs(["View Hierarchy", "Add Entity", "Edit/Delete Entity"])
     
     with tab1:
         st.subheader("Current Legal Entity Hierarchy")
         
-        entities_df = load_data("legal_entities")
-        
         if not entities_df.empty:
+            # Each option list computed once and shared by options= and default=
+            status_options = entities_df['status'].unique().tolist()
+            entity_type_options = entities_df['entity_type'].unique().tolist()
+            
             col1, col2 = st.columns(2)
             with col1:
                 status_filter = st.multiselect(
                     "Filter by Status",
-                    options=entities_df['status'].unique(),
-                    default=entities_df['status'].unique()
+                    options=status_options,
+                    default=status_options
                 )
             with col2:
                 entity_type_filter = st.multiselect(
                     "Filter by Entity Type",
-                    options=entities_df['entity_type'].unique(),
-                    default=entities_df['entity_type'].unique()
+                    options=entity_type_options,
+                    default=entity_type_options
                 )
             
             filtered_df = entities_df[
@@ -252,7 +497,7 @@ if page == "Legal Entity Hierarchy":
             ]
             
             st.dataframe(
-                filtered_df[['abn', 'entity_name', 'parent_abn', 'entity_type', 'status', 'effective_date']],
+                paginate(filtered_df, "entities_page"),
                 use_container_width=True,
                 hide_index=True
             )
@@ -263,51 +508,62 @@ if page == "Legal Entity Hierarchy":
             # Visualization type selector
             viz_type = st.radio("Select Visualization Type", ["Interactive Tree Diagram", "Text Tree"], horizontal=True)
             
+            # Group rows by parent once, already in name order, so both tree walks are O(N)
+            sorted_df = filtered_df.sort_values('entity_name')
+            abns = sorted_df['abn'].to_numpy()
+            names = sorted_df['entity_name'].to_numpy()
+            types = sorted_df['entity_type'].to_numpy()
+            statuses = sorted_df['status'].to_numpy()
+            children_by_parent = {}
+            for i, parent in enumerate(sorted_df['parent_abn'].to_numpy()):
+                children_by_parent.setdefault(parent, []).append(i)
+            
             if viz_type == "Interactive Tree Diagram":
                 # Build HTML tree structure
-                def build_html_tree(parent_abn, entities, level=0):
-                    """Recursively build HTML tree structure"""
-                    children = entities[entities['parent_abn'] == parent_abn].sort_values('entity_name')
-                    
-                    if children.empty:
+                def build_html_tree(parent_abn):
+                    """Build the nested HTML list below parent_abn"""
+                    children = children_by_parent.get(parent_abn)
+                    if not children:
                         return ""
                     
-                    html = "<ul>"
-                    for idx, child in children.iterrows():
+                    # Stack holds row indices still to render and closing tags to emit once their children are done
+                    html = ["<ul>"]
+                    stack = ["</ul>"] + children[::-1]
+                    while stack:
+                        i = stack.pop()
+                        if isinstance(i, str):
+                            html.append(i)
+                            continue
+                        
                         # Entity type styling
-                        if child['entity_type'] == 'Parent':
-                            node_class = "parent-node"
-                            type_emoji = "🏛️"
-                        elif child['entity_type'] == 'Subsidiary':
-                            node_class = "subsidiary-node"
-                            type_emoji = "🏢"
-                        elif child['entity_type'] == 'JV':
-                            node_class = "jv-node"
-                            type_emoji = "🤝"
-                        else:
-                            node_class = "other-node"
-                            type_emoji = "📋"
+                        node_class = NODE_CLASS.get(types[i], "other-node")
+                        type_emoji = TYPE_EMOJI.get(types[i], "📋")
                         
-                        status_badge = "active" if child['status'] == 'Active' else "inactive"
+                        status_badge = "active" if statuses[i] == 'Active' else "inactive"
                         
-                        html += f"""
+                        html.append(f"""
                         <li>
                             <div class="tree-node {node_class}">
                                 <span class="node-emoji">{type_emoji}</span>
                                 <div class="node-content">
-                                    <div class="node-name">{child['entity_name']}</div>
+                                    <div class="node-name">{names[i]}</div>
                                     <div class="node-details">
-                                        <span class="node-abn">ABN: {child['abn']}</span>
-                                        <span class="node-type">{child['entity_type']}</span>
-                                        <span class="status-badge {status_badge}">{child['status']}</span>
+                                        <span class="node-abn">ABN: {abns[i]}</span>
+                                        <span class="node-type">{types[i]}</span>
+                                        <span class="status-badge {status_badge}">{statuses[i]}</span>
                                     </div>
                                 </div>
                             </div>
-                            {build_html_tree(child['abn'], entities, level + 1)}
-                        </li>
-                        """
-                    html += "</ul>"
-                    return html
+                        """)
+                        
+                        # Open this node's child list; its closing tags pop after the children
+                        grandchildren = children_by_parent.get(abns[i])
+                        if grandchildren:
+                            html.append("<ul>")
+                            stack += ["</li>", "</ul>"] + grandchildren[::-1]
+                        else:
+                            html.append("</li>")
+                    return "".join(html)
                 
                 # Find root entities
                 root_entities = filtered_df[filtered_df['parent_abn'].isna()]
@@ -440,10 +696,10 @@ if page == "Legal Entity Hierarchy":
                     <div class="tree-container">
                     """
                     
-                    for _, root in root_entities.iterrows():
-                        type_emoji = "🏛️" if root['entity_type'] == 'Parent' else "🏢"
-                        status_badge = "active" if root['status'] == 'Active' else "inactive"
-                        node_class = "parent-node" if root['entity_type'] == 'Parent' else "subsidiary-node"
+                    for root in root_entities.itertuples(index=False):
+                        type_emoji = "🏛️" if root.entity_type == 'Parent' else "🏢"
+                        status_badge = "active" if root.status == 'Active' else "inactive"
+                        node_class = "parent-node" if root.entity_type == 'Parent' else "subsidiary-node"
                         
                         tree_html += f"""
                         <ul>
@@ -451,15 +707,15 @@ if page == "Legal Entity Hierarchy":
                                 <div class="tree-node {node_class}">
                                     <span class="node-emoji">{type_emoji}</span>
                                     <div class="node-content">
-                                        <div class="node-name">{root['entity_name']}</div>
+                                        <div class="node-name">{root.entity_name}</div>
                                         <div class="node-details">
-                                            <span class="node-abn">ABN: {root['abn']}</span>
-                                            <span class="node-type">{root['entity_type']}</span>
-                                            <span class="status-badge {status_badge}">{root['status']}</span>
+                                            <span class="node-abn">ABN: {root.abn}</span>
+                                            <span class="node-type">{root.entity_type}</span>
+                                            <span class="status-badge {status_badge}">{root.status}</span>
                                         </div>
                                     </div>
                                 </div>
-                                {build_html_tree(root['abn'], filtered_df, level=1)}
+                                {build_html_tree(root.abn)}
                             </li>
                         </ul>
                         """
@@ -471,48 +727,45 @@ if page == "Legal Entity Hierarchy":
                     st.info("No root entities found.")
             
             else:  # Text Tree
-                def build_tree(parent_abn, entities, prefix=""):
-                    """Recursively build and display hierarchy tree with proper branching"""
-                    children = entities[entities['parent_abn'] == parent_abn].sort_values('entity_name')
-                    num_children = len(children)
+                def build_tree(parent_abn, lines):
+                    """Append the hierarchy below parent_abn to lines with proper branching"""
+                    # Stack of (row, prefix, is_last); children are pushed reversed to keep name order
+                    stack = []
                     
-                    for idx, (child_idx, child) in enumerate(children.iterrows()):
-                        is_last = (idx == num_children - 1)
+                    def push_children(abn, prefix):
+                        children = children_by_parent.get(abn, [])
+                        for pos in range(len(children) - 1, -1, -1):
+                            stack.append((children[pos], prefix, pos == len(children) - 1))
+                    
+                    push_children(parent_abn, "")
+                    while stack:
+                        i, prefix, is_last = stack.pop()
                         
                         # Build the tree branch characters
                         branch = "└── " if is_last else "├── "
                         
-                        # Entity type emoji
-                        if child['entity_type'] == 'Parent':
-                            type_emoji = "🏛️"
-                        elif child['entity_type'] == 'Subsidiary':
-                            type_emoji = "🏢"
-                        elif child['entity_type'] == 'JV':
-                            type_emoji = "🤝"
-                        else:
-                            type_emoji = "📋"
-                        
-                        # Status emoji
-                        status_emoji = "✅" if child['status'] == 'Active' else "⏸️"
+                        # Entity type and status emoji
+                        type_emoji = TYPE_EMOJI.get(types[i], "📋")
+                        status_emoji = STATUS_EMOJI.get(statuses[i], "⏸️")
                         
-                        # Display the entity
-                        st.text(f"{prefix}{branch}{type_emoji} {child['entity_name']} ({child['abn']}) - {child['entity_type']} {status_emoji}")
+                        # Add the entity line
+                        lines.append(f"{prefix}{branch}{type_emoji} {names[i]} ({abns[i]}) - {types[i]} {status_emoji}")
                         
-                        # Prepare prefix for next level
-                        next_prefix = prefix + ("    " if is_last else "│   ")
-                        
-                        # Recurse for children
-                        build_tree(child['abn'], entities, next_prefix)
+                        # Queue children with the prefix for the next level
+                        push_children(abns[i], prefix + ("    " if is_last else "│   "))
                 
                 # Find all root entities
                 root_entities = filtered_df[filtered_df['parent_abn'].isna()]
                 
                 if not root_entities.empty:
-                    for _, root in root_entities.iterrows():
-                        type_emoji = "🏛️" if root['entity_type'] == 'Parent' else "🏢"
-                        status_emoji = "✅" if root['status'] == 'Active' else "⏸️"
-                        st.text(f"{type_emoji} {root['entity_name']} ({root['abn']}) - {root['entity_type']} {status_emoji}")
-                        build_tree(root['abn'], filtered_df, "")
+                    # Render the whole tree as one block instead of one element per entity
+                    lines = []
+                    for root in root_entities.itertuples(index=False):
+                        type_emoji = "🏛️" if root.entity_type == 'Parent' else "🏢"
+                        status_emoji = STATUS_EMOJI.get(root.status, "⏸️")
+                        lines.append(f"{type_emoji} {root.entity_name} ({root.abn}) - {root.entity_type} {status_emoji}")
+                        build_tree(root.abn, lines)
+                    st.code("\n".join(lines), language=None)
                 else:
                     st.info("No root entities found.")
                 
@@ -520,105 +773,110 @@ if page == "Legal Entity Hierarchy":
             st.info("No legal entities found.")
     
     with tab2:
-        st.subheader("Add New Legal Entity")
-        
-        with st.form("add_entity_form"):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                new_abn = st.text_input("ABN *", max_chars=11)
-                new_entity_name = st.text_input("Entity Name *")
-                new_entity_type = st.selectbox("Entity Type *", ["Parent", "Subsidiary", "JV", "Branch", "Other"])
-            
-            with col2:
-                entities_df = load_data("legal_entities")
-                parent_options = ["None"] + entities_df['abn'].tolist() if not entities_df.empty else ["None"]
-                new_parent_abn = st.selectbox("Parent ABN", parent_options)
-                new_status = st.selectbox("Status", ["Active", "Inactive", "Pending"])
-                new_effective_date = st.date_input("Effective Date", value=date.today())
+        @st.fragment
+        def add_entity_tab():
+            """Add-entity form, rerun on its own when the form is submitted"""
+            st.subheader("Add New Legal Entity")
             
-            submitted = st.form_submit_button("Add Legal Entity")
+            # Outside the form so the parent choices refresh as the user types; the selectbox
+            # then only carries a bounded list instead of every ABN in the table
+            parent_search = st.text_input("Search Parent (ABN or name)")
+            parent_names = search_parent_entities(parent_search.strip())
             
-            if submitted:
-                if not new_abn or len(new_abn) != 11:
-                    st.error("Please enter a valid 11-digit ABN")
-                elif not new_entity_name:
-                    st.error("Please enter an entity name")
-                else:
-                    if not entities_df.empty and new_abn in entities_df['abn'].values:
-                        st.error(f"ABN {new_abn} already exists!")
+            with st.form("add_entity_form"):
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    new_abn = st.text_input("ABN *", max_chars=11)
+                    new_entity_name = st.text_input("Entity Name *")
+                    new_entity_type = st.selectbox("Entity Type *", ["Parent", "Subsidiary", "JV", "Branch", "Other"])
+                
+                with col2:
+                    new_parent_abn = st.selectbox(
+                        "Parent ABN",
+                        ["None"] + list(parent_names),
+                        format_func=lambda x: x if x == "None" else f"{parent_names[x]} ({x})"
+                    )
+                    new_status = st.selectbox("Status", ["Active", "Inactive", "Pending"])
+                    new_effective_date = st.date_input("Effective Date", value=date.today())
+                
+                submitted = st.form_submit_button("Add Legal Entity")
+                
+                if submitted:
+                    if not new_abn or len(new_abn) != 11:
+                        st.error("Please enter a valid 11-digit ABN")
+                    elif not new_entity_name:
+                        st.error("Please enter an entity name")
                     else:
-                        query = """
-                            INSERT INTO legal_entities 
-                            (abn, entity_name, parent_abn, entity_type, status, effective_date, created_by)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """
+                        # The ABN primary key rejects duplicates, no need to scan the loaded entities
                         params = (new_abn, new_entity_name, None if new_parent_abn == "None" else new_parent_abn,
                                 new_entity_type, new_status, new_effective_date, 'streamlit_user')
                         
-                        if execute_query(query, params):
+                        if execute_query(INSERT_ENTITY_SQL, params, duplicate_message=f"ABN {new_abn} already exists!"):
                             st.success(f"✅ Successfully added entity: {new_entity_name} ({new_abn})")
                             st.rerun()
+        
+        add_entity_tab()
     
     with tab3:
-        st.subheader("Edit or Delete Legal Entity")
-        
-        entities_df = load_data("legal_entities")
-        
-        if not entities_df.empty:
-            selected_abn = st.selectbox(
-                "Select Entity",
-                entities_df['abn'].tolist(),
-                format_func=lambda x: f"{entities_df[entities_df['abn']==x]['entity_name'].values[0]} ({x})"
-            )
+        @st.fragment
+        def edit_entity_tab(entities_df):
+            """Edit/delete entity controls, rerun on their own when used"""
+            # Fragment reruns replay the page's entities_df; every write ends in a full st.rerun(),
+            # so the frame is reloaded whenever the table changes
+            st.subheader("Edit or Delete Legal Entity")
             
-            if selected_abn:
-                entity_data = entities_df[entities_df['abn'] == selected_abn].iloc[0]
-                
-                col1, col2 = st.columns([3, 1])
+            if not entities_df.empty:
+                # Index by ABN once: the label lookup and the selected-row fetch are then
+                # hash lookups instead of boolean scans of the frame
+                entities_by_abn = entities_df.set_index('abn')
+                name_by_abn = entities_by_abn['entity_name'].to_dict()
+                selected_abn = st.selectbox(
+                    "Select Entity",
+                    list(name_by_abn),
+                    format_func=lambda x: f"{name_by_abn[x]} ({x})"
+                )
                 
-                with col1:
-                    with st.form("edit_entity_form"):
-                        st.write("**Edit Entity Details**")
-                        
-                        edit_col1, edit_col2 = st.columns(2)
-                        
-                        with edit_col1:
-                            edit_name = st.text_input("Entity Name", value=entity_data['entity_name'])
-                            entity_types = ["Parent", "Subsidiary", "JV", "Branch", "Other"]
-                            current_type_idx = entity_types.index(entity_data['entity_type']) if entity_data['entity_type'] in entity_types else 0
-                            edit_type = st.selectbox("Entity Type", entity_types, index=current_type_idx)
-                        
-                        with edit_col2:
-                            statuses = ["Active", "Inactive", "Pending"]
-                            current_status_idx = statuses.index(entity_data['status']) if entity_data['status'] in statuses else 0
-                            edit_status = st.selectbox("Status", statuses, index=current_status_idx)
-                        
-                        update_submitted = st.form_submit_button("Update Entity")
-                        
-                        if update_submitted:
-                            query = """
-                                UPDATE legal_entities 
-                                SET entity_name = ?, entity_type = ?, status = ?, modified_by = ?, modified_date = ?
-                                WHERE abn = ?
-                            """
-                            params = (edit_name, edit_type, edit_status, 'streamlit_user', datetime.now(), selected_abn)
+                if selected_abn:
+                    entity_data = entities_by_abn.loc[selected_abn]
+                    
+                    col1, col2 = st.columns([3, 1])
+                    
+                    with col1:
+                        with st.form("edit_entity_form"):
+                            st.write("**Edit Entity Details**")
                             
-                            if execute_query(query, params):
-                                st.success("✅ Entity updated successfully!")
-                                st.rerun()
-                
-                with col2:
-                    st.write("")
-                    st.write("")
-                    if st.button("🗑️ Delete", type="secondary", use_container_width=True):
-                        children = entities_df[entities_df['parent_abn'] == selected_abn]
-                        if not children.empty:
-                            st.error("❌ Cannot delete entity with children!")
-                        else:
-                            if delete_record("legal_entities", "abn", selected_abn):
+                            edit_col1, edit_col2 = st.columns(2)
+                            
+                            with edit_col1:
+                                edit_name = st.text_input("Entity Name", value=entity_data['entity_name'])
+                                entity_types = ["Parent", "Subsidiary", "JV", "Branch", "Other"]
+                                current_type_idx = entity_types.index(entity_data['entity_type']) if entity_data['entity_type'] in entity_types else 0
+                                edit_type = st.selectbox("Entity Type", entity_types, index=current_type_idx)
+                            
+                            with edit_col2:
+                                statuses = ["Active", "Inactive", "Pending"]
+                                current_status_idx = statuses.index(entity_data['status']) if entity_data['status'] in statuses else 0
+                                edit_status = st.selectbox("Status", statuses, index=current_status_idx)
+                            
+                            update_submitted = st.form_submit_button("Update Entity")
+                            
+                            if update_submitted:
+                                params = (edit_name, edit_type, edit_status, 'streamlit_user', datetime.now(), selected_abn)
+                                
+                                if execute_query(UPDATE_ENTITY_SQL, params):
+                                    st.success("✅ Entity updated successfully!")
+                                    st.rerun()
+                    
+                    with col2:
+                        st.write("")
+                        st.write("")
+                        if st.button("🗑️ Delete", type="secondary", use_container_width=True):
+                            if delete_entity(selected_abn):
                                 st.success("✅ Deleted successfully!")
                                 st.rerun()
+        
+        edit_entity_tab(entities_df)
 
 # ============================================================================
 # PAGE 2: SECTOR CODE MAPPINGS
@@ -631,51 +889,35 @@ elif page == "Sector Code Mappings":
     with tab1:
         st.subheader("Current Sector Code Mappings")
         
-        conn = sqlite3.connect(DB_FILE)
-        query = """
-            SELECT 
-                m.mapping_id, m.reporting_group_code, g.reporting_group_name,
-                m.sector_code, s.sector_name, m.abn, e.entity_name,
-                m.consolidation_percentage, m.effective_date, m.end_date, m.is_active
-            FROM sector_abn_mapping m
-            LEFT JOIN reporting_groups g ON m.reporting_group_code = g.reporting_group_code
-            LEFT JOIN sector_codes s ON m.sector_code = s.sector_code
-            LEFT JOIN legal_entities e ON m.abn = e.abn
-            ORDER BY g.reporting_group_name, s.sector_name
-        """
-        mappings_df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        if not mappings_df.empty:
+        if exists("sector_abn_mapping"):
+            # Filter options come from the small cached reference tables, not the mapping rows
+            group_options = load_data("reporting_groups", REPORTING_GROUP_COLUMNS)['reporting_group_name'].tolist()
+            sector_options = load_data("sector_codes", SECTOR_CODE_COLUMNS)['sector_name'].tolist()
+            
             col1, col2, col3 = st.columns(3)
             
             with col1:
                 group_filter = st.multiselect(
                     "Filter by Reporting Group",
-                    options=mappings_df['reporting_group_name'].unique(),
-                    default=mappings_df['reporting_group_name'].unique()
+                    options=group_options,
+                    default=group_options
                 )
             
             with col2:
                 sector_filter = st.multiselect(
                     "Filter by Sector",
-                    options=mappings_df['sector_name'].unique(),
-                    default=mappings_df['sector_name'].unique()
+                    options=sector_options,
+                    default=sector_options
                 )
             
             with col3:
                 active_only = st.checkbox("Show Active Only", value=True)
             
-            filtered = mappings_df[
-                (mappings_df['reporting_group_name'].isin(group_filter)) &
-                (mappings_df['sector_name'].isin(sector_filter))
-            ]
-            
-            if active_only:
-                filtered = filtered[filtered['is_active'] == 1]
+            # Tuples so the selections can key the query cache
+            filtered = load_mappings_joined(tuple(group_filter), tuple(sector_filter), active_only)
             
             st.dataframe(
-                filtered[['reporting_group_name', 'sector_name', 'entity_name', 'abn', 'consolidation_percentage', 'effective_date', 'is_active']],
+                paginate(filtered, "mappings_page")[['reporting_group_name', 'sector_name', 'entity_name', 'abn', 'consolidation_percentage', 'effective_date', 'is_active']],
                 use_container_width=True,
                 hide_index=True
             )
@@ -685,139 +927,137 @@ elif page == "Sector Code Mappings":
             with col1:
                 st.metric("Total Mappings", len(filtered))
             with col2:
-                st.metric("Active Mappings", len(filtered[filtered['is_active'] == 1]))
+                st.metric("Active Mappings", int((filtered['is_active'] == 1).sum()))
             with col3:
                 st.metric("Unique Entities", filtered['abn'].nunique())
         else:
             st.info("No mappings found.")
     
     with tab2:
-        st.subheader("Add New Sector Code Mapping")
-        
-        groups_df = load_data("reporting_groups")
-        sector_codes_df = load_data("sector_codes")
-        entities_df = load_data("legal_entities")
-        
-        if not groups_df.empty and not sector_codes_df.empty and not entities_df.empty:
-            with st.form("add_mapping_form"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    mapping_group = st.selectbox(
-                        "Reporting Group *",
-                        groups_df['reporting_group_code'].tolist(),
-                        format_func=lambda x: groups_df[groups_df['reporting_group_code']==x]['reporting_group_name'].values[0]
-                    )
-                    
-                    mapping_sector = st.selectbox(
-                        "Sector Code *",
-                        sector_codes_df['sector_code'].tolist(),
-                        format_func=lambda x: f"{sector_codes_df[sector_codes_df['sector_code']==x]['sector_name'].values[0]} ({x})"
-                    )
-                    
-                    mapping_abn = st.selectbox(
-                        "ABN *",
-                        entities_df['abn'].tolist(),
-                        format_func=lambda x: f"{entities_df[entities_df['abn']==x]['entity_name'].values[0]} ({x})"
-                    )
-                
-                with col2:
-                    consolidation_pct = st.number_input(
-                        "Consolidation Percentage *",
-                        min_value=0.0,
-                        max_value=100.0,
-                        value=100.0,
-                        step=0.1,
-                        help="Percentage of consolidation (0-100)"
-                    )
-                    
-                    mapping_effective_date = st.date_input("Effective Date", value=date.today())
-                
-                submitted = st.form_submit_button("Add Mapping")
-                
-                if submitted:
-                    mapping_id = f"MAP{str(uuid.uuid4())[:8].upper()}"
-                    
-                    query = """
-                        INSERT INTO sector_abn_mapping 
-                        (mapping_id, reporting_group_code, sector_code, abn, consolidation_percentage, effective_date, created_by)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """
-                    params = (mapping_id, mapping_group, mapping_sector, mapping_abn, consolidation_pct, mapping_effective_date, 'streamlit_user')
-                    
-                    if execute_query(query, params):
-                        st.success("✅ Mapping added successfully!")
-                        st.rerun()
-        else:
-            st.warning("⚠️ Please configure Reference Data first.")
-    
-    with tab3:
-        st.subheader("Edit or Delete Mapping")
-        
-        conn = sqlite3.connect(DB_FILE)
-        query = """
-            SELECT 
-                m.mapping_id, g.reporting_group_name, s.sector_name, e.entity_name,
-                m.consolidation_percentage, m.effective_date, m.end_date, m.is_active
-            FROM sector_abn_mapping m
-            LEFT JOIN reporting_groups g ON m.reporting_group_code = g.reporting_group_code
-            LEFT JOIN sector_codes s ON m.sector_code = s.sector_code
-            LEFT JOIN legal_entities e ON m.abn = e.abn
-        """
-        mappings_df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        if not mappings_df.empty:
-            selected_mapping = st.selectbox(
-                "Select Mapping",
-                mappings_df['mapping_id'].tolist(),
-                format_func=lambda x: f"{mappings_df[mappings_df['mapping_id']==x]['reporting_group_name'].values[0]} | {mappings_df[mappings_df['mapping_id']==x]['sector_name'].values[0]} → {mappings_df[mappings_df['mapping_id']==x]['entity_name'].values[0]} ({mappings_df[mappings_df['mapping_id']==x]['consolidation_percentage'].values[0]}%)"
-            )
+        @st.fragment
+        def add_mapping_tab():
+            """Add-mapping form, rerun on its own when the form is submitted"""
+            st.subheader("Add New Sector Code Mapping")
             
-            if selected_mapping:
-                mapping_data = mappings_df[mappings_df['mapping_id'] == selected_mapping].iloc[0]
-                
-                col1, col2 = st.columns([3, 1])
+            # Option lists come from the shared label dicts' keys instead of separate .tolist() passes
+            lookups = get_lookups()
+            group_name_by_code = lookups["group_name"]
+            sector_name_by_code = lookups["sector_name"]
+            name_by_abn = lookups["entity_name"]
+            
+            if group_name_by_code and sector_name_by_code and name_by_abn:
                 
-                with col1:
-                    with st.form("edit_mapping_form"):
-                        st.write("**Edit Mapping**")
+                with st.form("add_mapping_form"):
+                    col1, col2 = st.columns(2)
+                    
+                    with col1:
+                        mapping_group = st.selectbox(
+                            "Reporting Group *",
+                            list(group_name_by_code),
+                            format_func=lambda x: group_name_by_code[x]
+                        )
                         
-                        edit_consolidation = st.number_input(
-                            "Consolidation Percentage",
+                        mapping_sector = st.selectbox(
+                            "Sector Code *",
+                            list(sector_name_by_code),
+                            format_func=lambda x: f"{sector_name_by_code[x]} ({x})"
+                        )
+                        
+                        mapping_abn = st.selectbox(
+                            "ABN *",
+                            list(name_by_abn),
+                            format_func=lambda x: f"{name_by_abn[x]} ({x})"
+                        )
+                    
+                    with col2:
+                        consolidation_pct = st.number_input(
+                            "Consolidation Percentage *",
                             min_value=0.0,
                             max_value=100.0,
-                            value=float(mapping_data['consolidation_percentage']),
-                            step=0.1
+                            value=100.0,
+                            step=0.1,
+                            help="Percentage of consolidation (0-100)"
                         )
                         
-                        edit_active = st.checkbox("Active", value=bool(mapping_data['is_active']))
-                        edit_end_date = st.date_input(
-                            "End Date (Optional)", 
-                            value=pd.to_datetime(mapping_data['end_date']).date() if pd.notna(mapping_data['end_date']) else None
-                        )
+                        mapping_effective_date = st.date_input("Effective Date", value=date.today())
+                    
+                    submitted = st.form_submit_button("Add Mapping")
+                    
+                    if submitted:
+                        mapping_id = new_mapping_id()
                         
-                        update_submitted = st.form_submit_button("Update")
+                        params = (mapping_id, mapping_group, mapping_sector, mapping_abn, consolidation_pct, mapping_effective_date, 'streamlit_user')
                         
-                        if update_submitted:
-                            query = """
-                                UPDATE sector_abn_mapping 
-                                SET consolidation_percentage = ?, is_active = ?, end_date = ?, modified_by = ?, modified_date = ?
-                                WHERE mapping_id = ?
-                            """
-                            params = (edit_consolidation, 1 if edit_active else 0, edit_end_date, 'streamlit_user', datetime.now(), selected_mapping)
+                        if execute_query(INSERT_MAPPING_SQL, params):
+                            st.success("✅ Mapping added successfully!")
+                            st.rerun()
+            else:
+                st.warning("⚠️ Please configure Reference Data first.")
+        
+        add_mapping_tab()
+    
+    with tab3:
+        @st.fragment
+        def edit_mapping_tab():
+            """Edit/delete mapping controls, rerun on their own when used"""
+            st.subheader("Edit or Delete Mapping")
+            
+            mappings_df = load_mappings_joined()
+            
+            if not mappings_df.empty:
+                # Index by mapping ID once so the selected-row fetch is a hash lookup
+                mappings_by_id = mappings_df.set_index('mapping_id')
+                mapping_labels = {
+                    row.mapping_id: f"{row.reporting_group_name} | {row.sector_name} → {row.entity_name} ({row.consolidation_percentage}%)"
+                    for row in mappings_df.itertuples(index=False)
+                }
+                selected_mapping = st.selectbox(
+                    "Select Mapping",
+                    list(mapping_labels),
+                    format_func=lambda x: mapping_labels[x]
+                )
+                
+                if selected_mapping:
+                    mapping_data = mappings_by_id.loc[selected_mapping]
+                    
+                    col1, col2 = st.columns([3, 1])
+                    
+                    with col1:
+                        with st.form("edit_mapping_form"):
+                            st.write("**Edit Mapping**")
+                            
+                            edit_consolidation = st.number_input(
+                                "Consolidation Percentage",
+                                min_value=0.0,
+                                max_value=100.0,
+                                value=float(mapping_data['consolidation_percentage']),
+                                step=0.1
+                            )
+                            
+                            edit_active = st.checkbox("Active", value=bool(mapping_data['is_active']))
+                            edit_end_date = st.date_input(
+                                "End Date (Optional)", 
+                                value=mapping_data['end_date'] if pd.notna(mapping_data['end_date']) else None
+                            )
                             
-                            if execute_query(query, params):
-                                st.success("✅ Updated successfully!")
+                            update_submitted = st.form_submit_button("Update")
+                            
+                            if update_submitted:
+                                params = (edit_consolidation, 1 if edit_active else 0, edit_end_date, 'streamlit_user', datetime.now(), selected_mapping)
+                                
+                                if execute_query(UPDATE_MAPPING_SQL, params):
+                                    st.success("✅ Updated successfully!")
+                                    st.rerun()
+                    
+                    with col2:
+                        st.write("")
+                        st.write("")
+                        if st.button("🗑️ Delete", type="secondary", use_container_width=True):
+                            if delete_record("sector_abn_mapping", "mapping_id", selected_mapping):
+                                st.success("✅ Deleted!")
                                 st.rerun()
-                
-                with col2:
-                    st.write("")
-                    st.write("")
-                    if st.button("🗑️ Delete", type="secondary", use_container_width=True):
-                        if delete_record("sector_abn_mapping", "mapping_id", selected_mapping):
-                            st.success("✅ Deleted!")
-                            st.rerun()
+        
+        edit_mapping_tab()
 
 # ============================================================================
 # PAGE 3: REFERENCE DATA
@@ -828,66 +1068,76 @@ elif page == "Reference Data":
     tab1, tab2 = st.tabs(["Reporting Groups", "Sector Codes"])
     
     with tab1:
-        st.subheader("Reporting Groups")
-        
-        groups_df = load_data("reporting_groups")
-        
-        col1, col2 = st.columns([2, 1])
-        
-        with col1:
-            if not groups_df.empty:
-                st.dataframe(
-                    groups_df[['reporting_group_code', 'reporting_group_name', 'description', 'is_active']],
-                    use_container_width=True,
-                    hide_index=True
-                )
+        @st.fragment
+        def reporting_groups_tab():
+            """Reporting group list and add form, rerun on their own"""
+            st.subheader("Reporting Groups")
+            
+            groups_df = load_data("reporting_groups", REPORTING_GROUP_COLUMNS)
+            
+            col1, col2 = st.columns([2, 1])
+            
+            with col1:
+                if not groups_df.empty:
+                    st.dataframe(
+                        paginate(groups_df, "groups_page"),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+            
+            with col2:
+                with st.form("add_reporting_group"):
+                    st.write("**Add New**")
+                    new_code = st.text_input("Code", max_chars=20)
+                    new_name = st.text_input("Name")
+                    new_desc = st.text_area("Description")
+                    
+                    if st.form_submit_button("Add"):
+                        if new_code and new_name:
+                            if execute_query(INSERT_REPORTING_GROUP_SQL, (new_code, new_name, new_desc),
+                                             duplicate_message=f"Code {new_code} already exists!"):
+                                st.success("✅ Added!")
+                                st.rerun()
+                        else:
+                            st.error("Fill required fields")
         
-        with col2:
-            with st.form("add_reporting_group"):
-                st.write("**Add New**")
-                new_code = st.text_input("Code", max_chars=20)
-                new_name = st.text_input("Name")
-                new_desc = st.text_area("Description")
-                
-                if st.form_submit_button("Add"):
-                    if new_code and new_name:
-                        query = "INSERT INTO reporting_groups (reporting_group_code, reporting_group_name, description) VALUES (?, ?, ?)"
-                        if execute_query(query, (new_code, new_name, new_desc)):
-                            st.success("✅ Added!")
-                            st.rerun()
-                    else:
-                        st.error("Fill required fields")
+        reporting_groups_tab()
     
     with tab2:
-        st.subheader("Sector Codes")
-        
-        sector_codes_df = load_data("sector_codes")
-        
-        col1, col2 = st.columns([2, 1])
-        
-        with col1:
-            if not sector_codes_df.empty:
-                st.dataframe(
-                    sector_codes_df[['sector_code', 'sector_name', 'sector_description', 'is_active']],
-                    use_container_width=True,
-                    hide_index=True
-                )
+        @st.fragment
+        def sector_codes_tab():
+            """Sector code list and add form, rerun on their own"""
+            st.subheader("Sector Codes")
+            
+            sector_codes_df = load_data("sector_codes", SECTOR_CODE_COLUMNS)
+            
+            col1, col2 = st.columns([2, 1])
+            
+            with col1:
+                if not sector_codes_df.empty:
+                    st.dataframe(
+                        paginate(sector_codes_df, "sectors_page"),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+            
+            with col2:
+                with st.form("add_sector_code"):
+                    st.write("**Add New**")
+                    new_code = st.text_input("Code", max_chars=10)
+                    new_name = st.text_input("Name")
+                    new_desc = st.text_area("Description")
+                    
+                    if st.form_submit_button("Add"):
+                        if new_code and new_name:
+                            if execute_query(INSERT_SECTOR_CODE_SQL, (new_code, new_name, new_desc),
+                                             duplicate_message=f"Code {new_code} already exists!"):
+                                st.success("✅ Added!")
+                                st.rerun()
+                        else:
+                            st.error("Fill required fields")
         
-        with col2:
-            with st.form("add_sector_code"):
-                st.write("**Add New**")
-                new_code = st.text_input("Code", max_chars=10)
-                new_name = st.text_input("Name")
-                new_desc = st.text_area("Description")
-                
-                if st.form_submit_button("Add"):
-                    if new_code and new_name:
-                        query = "INSERT INTO sector_codes (sector_code, sector_name, sector_description) VALUES (?, ?, ?)"
-                        if execute_query(query, (new_code, new_name, new_desc)):
-                            st.success("✅ Added!")
-                            st.rerun()
-                    else:
-                        st.error("Fill required fields")
+        sector_codes_tab()
 
 # Footer
 st.markdown("---")